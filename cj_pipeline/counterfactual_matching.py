@@ -4,6 +4,7 @@ import datetime
 import numpy as np
 import pandas as pd
 from absl import app, flags
+from joblib import Parallel, delayed, parallel_backend
 
 from cj_pipeline.synthetic_assignment import get_synth
 from cj_pipeline.neulaw.preprocess import init_rai_year_range
@@ -66,14 +67,23 @@ def _binarize_treatment(
   if len(binary_treatment_set) != 2:
     raise ValueError("binary_treatment_set must have 2 keys")
 
-  df = df.copy()
   if "Rest" in binary_treatment_set.keys():
     values = df[treatment].unique()
     other = set(values) - set(binary_treatment_set.keys())
     for o_i in other:
       binary_treatment_set[o_i] = binary_treatment_set["Rest"]
-  df = df[df[treatment].isin(list(binary_treatment_set.keys()))]
-  df[treatment] = df[treatment].map(binary_treatment_set)
+
+  # codes index into the treatment values; -1 for values outside the set
+  categories = [k for k in binary_treatment_set.keys() if pd.notna(k)]
+  codes = pd.Categorical(df[treatment], categories=categories).codes
+  lut = [binary_treatment_set[k] for k in categories]
+  missing = [k for k in binary_treatment_set.keys() if pd.isna(k)]
+  if missing:  # missing values are in the set (as "Rest") -> extra code
+    codes = np.where(df[treatment].isna(), len(categories), codes)
+    lut.append(binary_treatment_set[missing[0]])
+  lut = np.array(lut, dtype=np.int8)
+  keep = codes >= 0
+  df = df[keep].assign(**{treatment: lut[codes[keep]]})
   return df, {'treated': {v: k for k, v in binary_treatment_set.items()}}
 
 
@@ -88,14 +98,34 @@ def _binarize_crimes(df: pd.DataFrame, bins: list):
 
 
 def _binarize_demographics(df, treatment):
-  codes = {}
-  for dem in set(DEMOGRAPHICS) - {treatment}:
-    categorical = pd.Categorical(df[dem])
-    codes[dem] = dict(enumerate(categorical.categories))
-    df[dem] = categorical.codes
+  dem_cols = [dem for dem in DEMOGRAPHICS if dem != treatment]
+  factorized = [pd.factorize(df[dem], sort=True) for dem in dem_cols]
+  codes = {
+    dem: dict(enumerate(uniques)) for dem, (_, uniques) in zip(dem_cols, factorized)
+  }
+  df[dem_cols] = np.stack([c for c, _ in factorized], axis=1).astype(np.int8)
   return df, codes
 
 
+def _group_effects(model):
+  """CATEs and ATE weights of each matched group (cf. `post_processing.ATE`)."""
+  treated, outcome = model.treatment_column_name, model.outcome_column_name
+  groups = model.units_per_group
+  units = np.concatenate(groups)
+  group_ids = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+
+  data = model.input_data.loc[units, [treated, outcome]]
+  means = data[outcome].groupby([group_ids, data[treated].to_numpy()]).mean()
+  means = means.unstack()
+  cates = means[1] - means[0]
+  weights = model.groups_per_unit.loc[units].groupby(group_ids).sum()
+
+  # main matched group of a unit is the first group that contains it
+  unit_groups = pd.Series(group_ids, index=units)
+  unit_groups = unit_groups[~unit_groups.index.duplicated(keep='first')]
+  return cates, weights, unit_groups
+
+
 def _matching_model(score_df, matching_alg, repeat_match):
   matching_alg = matching_alg.lower()
   if matching_alg not in MATCHING_ALGS:
@@ -109,14 +139,24 @@ def _matching_model(score_df, matching_alg, repeat_match):
 
   model.fit(score_df)
   matches = model.predict(score_df, **kwargs)
+  group_cates, weights, unit_groups = _group_effects(model)
+  ate = (group_cates * weights).sum() / weights.sum()
+
   cates = matches.drop_duplicates()
-  cates['cate'] = dame_flame.utils.post_processing.CATE(model, cates.index)
+  cates['cate'] = unit_groups.reindex(cates.index).map(group_cates).to_numpy()
   counts = matches.value_counts().to_frame('group_size').reset_index()
   cates = pd.merge(
     cates, counts, how='left', on=cates.columns.difference(['cate']).to_list(),
   )
 
-  return model, cates
+  return model, ate, cates
+
+
+def _score_effects(score_df, matching_alg, repeat_match):
+  model, ate, cates = _matching_model(
+    score_df, matching_alg=matching_alg, repeat_match=repeat_match)
+  att = dame_flame.utils.post_processing.ATT(matching_object=model)
+  return ate, att, cates
 
 
 def average_treatment_effect(
@@ -130,6 +170,7 @@ def average_treatment_effect(
     n_subsample: int = None,
     seed: int = None,
     crime_bins: tuple = (-1, 0, 1, 2, 4, 9, 100_000),
+    n_jobs: int = -1,
     **kwargs  # passed to the synthetic assignment when `use_synth` is true
 ):
   rng = np.random.RandomState(seed)
@@ -161,27 +202,31 @@ def average_treatment_effect(
   df = df.drop(columns=SCORES)
   df = df.rename(columns={treatment: 'treated'})
 
-  results = []
-  conditional_results = []
+  score_dfs, n_dropped = {}, {}
   for score in SCORES:
-    logger.info(f"Calculating ATE for treatment: {treatment}. outcome: {score}")
-    score_df = df.copy()
-
-    score_df["outcome"] = all_score_df[score]
-    before_len = len(score_df)
-    score_df = score_df.dropna(subset=["outcome"])
-    n_dropped = before_len - len(score_df)
+    observed = all_score_df[score].notna()
+    score_df = df[observed].assign(outcome=all_score_df.loc[observed, score])
+    n_dropped[score] = len(df) - len(score_df)
     logger.info(
-      f"Dropped {n_dropped} rows with missing values for {score}")
+      f"Dropped {n_dropped[score]} rows with missing values for {score}")
 
     if n_subsample is not None:  # TODO: move subsampling outside for-score-loop
       n_subsample = min(n_subsample, len(score_df))
       score_df = score_df.sample(n=n_subsample, random_state=rng)
+    score_dfs[score] = score_df
 
-    model, cates = _matching_model(
-      score_df, matching_alg=matching_alg, repeat_match=repeat_match)
-    ate = dame_flame.utils.post_processing.ATE(matching_object=model)
-    att = dame_flame.utils.post_processing.ATT(matching_object=model)
+  # matching for each score is independent -> one worker per score
+  logger.info(f"Calculating ATE for treatment: {treatment}. outcomes: {SCORES}")
+  with parallel_backend('loky', inner_max_num_threads=1):  # no BLAS oversubscription
+    effects = Parallel(n_jobs=n_jobs)(
+      delayed(_score_effects)(
+        score_dfs[score], matching_alg=matching_alg, repeat_match=repeat_match)
+      for score in SCORES
+    )
+
+  results = []
+  conditional_results = []
+  for score, (ate, att, cates) in zip(SCORES, effects):
     cates = cates.replace(codes)
     cates['score'] = score
 
@@ -189,7 +234,7 @@ def average_treatment_effect(
       f"ATE for treatment: {treatment}. outcome: {score} is "
       f"ate={ate} att={att}")
     results.append({
-      'score': score, 'dropped': n_dropped,
+      'score': score, 'dropped': n_dropped[score],
       'ate': ate, 'att': att,  # 'cate': cate,
     })
     conditional_results.append(cates)
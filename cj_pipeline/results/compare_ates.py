@@ -1,6 +1,9 @@
-import json
+import csv
+import orjson
 import pathlib
 import pandas as pd
+from joblib import Parallel, delayed
+from cj_pipeline.results import utils
 from cj_pipeline.config import SCORES, BASE_DIR
 
 from typing import List
@@ -8,6 +11,18 @@ from typing import List
 DEFAULT_DIR = BASE_DIR / pathlib.Path('cj_pipeline/results/data')
 
 
+def _load_experiment(config_path, ate_path):
+  with open(config_path, 'rb') as f:
+    experiment = orjson.loads(f.read())
+    experiment['crime_bins'] = ' '.join(experiment['crime_bins'])
+  ates = {}
+  with open(ate_path, 'r', newline='') as f:
+    for row in csv.DictReader(f):  # tiny file -> skip pandas
+      ates.setdefault(row['score'], float(row['ate'] or 'nan'))
+  experiment.update({s: ates[s] for s in SCORES})
+  return experiment
+
+
 def aggregate(
     data_path: str | pathlib.Path = DEFAULT_DIR,
     drop_constant_cols: bool = True,
@@ -17,15 +32,10 @@ def aggregate(
   if not data_path.is_absolute():
     data_path = BASE_DIR / data_path
 
-  results = []
-  for path_object in data_path.rglob('*.json'):
-    with open(path_object, 'r') as f:
-      experiment = json.load(f)
-      experiment['crime_bins'] = ' '.join(experiment['crime_bins'])
-    fname = path_object.name[:path_object.name.rfind('.')]
-    ate = pd.read_csv(path_object.parents[0] / f'{fname}-ate.csv')
-    experiment.update({s: ate[ate.score == s]['ate'].iloc[0] for s in SCORES})
-    results.append(experiment)
+  results = Parallel(n_jobs=-1, prefer='threads')(
+    delayed(_load_experiment)(config_path, ate_path)
+    for config_path, ate_path in utils.experiment_files(data_path, suffix='-ate.csv')
+  )
   results = pd.DataFrame(results)
 
   if ignore_cols is not None:
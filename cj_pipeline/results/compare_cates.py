@@ -1,4 +1,3 @@
-import json
 import pathlib
 import numpy as np
 import pandas as pd
@@ -9,36 +8,29 @@ from cj_pipeline.config import BASE_DIR
 DEFAULT_DIR = BASE_DIR / pathlib.Path('cj_pipeline/results/data')
 
 
-def _load_cate(path_object):
-  # with open(path_object, 'r') as f:
-  #   experiment = json.load(f)
-  #   experiment['crime_bins'] = ' '.join(experiment['crime_bins'])
-  fname = path_object.name[:path_object.name.rfind('.')]
-  cate = pd.read_csv(path_object.parents[0] / f"{fname}-cate.csv")
-  return cate
-
-
 def _load_data(data_path):
   data_path = pathlib.Path(data_path)
   if not data_path.is_absolute():
     data_path = BASE_DIR / data_path
+  experiments = utils.experiment_files(data_path, suffix='-cate.csv')
 
   # load observed data
-  observed_paths = list(data_path.rglob('*_observed_*.json'))
+  observed_paths = [
+    cate_path for config_path, cate_path in experiments
+    if '_observed_' in config_path.name
+  ]
   if len(observed_paths) == 0:
     _, observed = utils.load_observed()
   elif len(observed_paths) == 1:
-    observed = _load_cate(observed_paths[0])
+    observed = pd.read_csv(observed_paths[0])
   else:
     raise ValueError(f'{len(observed_paths)} non-synth results in "{data_path}"')
 
   # load synth data
-  synth = []
-  for path_object in data_path.rglob('*.json'):
-    if '_observed_' in path_object.name:
-      continue
-    synth.append(_load_cate(path_object))
-  synth = pd.concat(synth)
+  synth = pd.concat([
+    pd.read_csv(cate_path) for config_path, cate_path in experiments
+    if '_observed_' not in config_path.name
+  ])
 
   return observed, synth
 
@@ -7,15 +7,18 @@ DATA_DIR = BASE_DIR / 'data' / 'processed'
 
 
 def _mean_and_sem(df, n_years):
-  def _sem(group):
-    weights = group['count'] / group['count'].sum()
-    errors = weights * (group['arrest_rate'] - group['arrest_rate_smooth'])**2
-    return (errors.sum() / n_years)**0.5
-
   groups = ['offender_race', 'offender_age', 'offender_sex', 'crime_recode']
-  means = df.groupby(groups)['arrest_rate_smooth'].mean().to_frame('mean').reset_index()
-  sems = df.groupby(groups).apply(_sem).to_frame('sem').reset_index()
-  df = pd.merge(means, sems, how='inner', on=groups)
+  df = df.assign(
+    sqerr=df['count'] * (df['arrest_rate'] - df['arrest_rate_smooth'])**2)
+  df = df.groupby(groups).agg(
+    mean=('arrest_rate_smooth', 'mean'),
+    sqerr=('sqerr', 'sum'),
+    count=('count', 'sum'),
+  ).reset_index()
+
+  # count-weighted mean squared error (zero for groups without counts)
+  df['sem'] = ((df['sqerr'] / df['count']).fillna(0) / n_years)**0.5
+  df = df.drop(columns=['sqerr', 'count'])
 
   return df
 
@@ -33,23 +36,16 @@ def _load_nsduh(smoothing):
   nsduh = nsduh[[c for c in nsduh.columns if not '_lam_' in c]]
   nsduh = nsduh[nsduh['offender_age'] != '< 18']
 
-  def _melt(id_vars, suffix, value_name):
-    df = nsduh.melt(
-      id_vars=id_vars,
-      value_vars=[c for c in nsduh if c not in id_vars and c.endswith(suffix)],
-      var_name='crime_recode', value_name=value_name,
-    )
-    df['crime_recode'].replace(
-      {v: v[:v.rfind('_')] for v in df['crime_recode'].unique()}, inplace=True
-    )
-    return df
-
+  # columns "<crime>_ar" / "<crime>_sar" -> (crime, metric) and stack the crimes
   id_vars = ['offender_race', 'offender_age', 'offender_sex', 'YEAR', 'count']
-  nsduh = pd.merge(
-    _melt(id_vars, suffix='_ar', value_name='arrest_rate'),
-    _melt(id_vars, suffix='_sar', value_name='arrest_rate_smooth'),
-    how='inner', on=id_vars + ['crime_recode']
+  metrics = {'_ar': 'arrest_rate', '_sar': 'arrest_rate_smooth'}
+  rate_cols = [c for c in nsduh if c not in id_vars and c.endswith(tuple(metrics))]
+  nsduh = nsduh.set_index(id_vars)[rate_cols]
+  nsduh.columns = pd.MultiIndex.from_tuples(
+    [(c[:c.rfind('_')], metrics[c[c.rfind('_'):]]) for c in rate_cols],
+    names=['crime_recode', None],
   )
+  nsduh = nsduh.stack(level='crime_recode', dropna=False).reset_index()
   nsduh = nsduh[nsduh['crime_recode'] != 'drugs_any']
 
   nsduh = _mean_and_sem(nsduh, n_years=nsduh['YEAR'].nunique())
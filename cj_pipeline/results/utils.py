@@ -1,14 +1,36 @@
+import os
+import pathlib
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
-from cj_pipeline.results.compare_ates import aggregate
+from cj_pipeline.results import compare_ates
 from cj_pipeline.counterfactual_matching import average_treatment_effect
 
 from typing import Callable, Tuple
 
 
+def experiment_files(data_path: pathlib.Path, suffix: str):
+  """Pairs of experiment configs (.json) and their `suffix` results file."""
+  pairs, dirs = [], [data_path]
+  while dirs:  # single scandir pass per directory, no per-file stat
+    configs, results = {}, set()
+    with os.scandir(dirs.pop()) as entries:
+      for entry in entries:
+        if entry.is_dir():
+          dirs.append(entry.path)
+        elif entry.name.endswith('.json'):
+          configs[entry.name[:-len('.json')]] = pathlib.Path(entry.path)
+        elif entry.name.endswith(suffix):
+          results.add(entry.name[:-len(suffix)])
+    for fname, path_object in configs.items():
+      if fname not in results:
+        raise FileNotFoundError(f'No "{suffix}" results for "{path_object}"')
+      pairs.append((path_object, path_object.parents[0] / f'{fname}{suffix}'))
+  return pairs
+
+
 def _nan2none(val):
   return None if pd.isna(val) else val
 
@@ -69,7 +91,7 @@ def barplot(
 
 def load_observed():
   # CAVEAT: assumes synth is based on run of `aggregate` & that binning didn't change
-  synth = aggregate(drop_constant_cols=False)
+  synth = compare_ates.aggregate(drop_constant_cols=False)
   exp = synth[synth.columns[synth.nunique() == 1]]
   exp = exp.drop_duplicates().iloc[0]  # only one row by def
 
@@ -1,7 +1,7 @@
 import numpy as np
 import pandas as pd
 from functools import partial
-from collections import Counter
+from numba import njit, prange
 
 from cj_pipeline.config import BASE_DIR, CRIMES, CRIMES_GROUP, NEULAW_TO_NCVS, NEULAW_TO_NSDUH, logger
 from cj_pipeline.neulaw.assignment_preprocessing import init_neulaw, init_ncvs, init_nsduh
@@ -56,15 +56,17 @@ def rolling_crime_assignment(
     start_year=start_year, end_year=end_year, window=window, rng=rng, **kwargs)
   years_in_window = window + 1  # end_year (= start_year + window) is included
 
-  samples = []
   for idx, window_end in enumerate(range(start_year + window, end_year + 1)):
     logger.info(f'Sampling for year window ending by year {window_end}')
-    samples.append(sample_window(
-      window_end, n_samples_div=1 if idx == 0 else years_in_window))
+    sample = sample_window(
+      window_end, n_samples_div=1 if idx == 0 else years_in_window)
+    sample = sample.drop(columns=['age_cat'])  # may conflict as people age between windows
 
-  df = pd.concat(samples)
-  df = df.drop(columns=['age_cat'])  # may conflict as people age between windows
-  df = df.groupby(df.columns.difference(CRIMES).to_list()).sum().reset_index()
+    # fold into the running total -> only one window held at a time
+    sample = sample.groupby(sample.columns.difference(CRIMES).to_list())[CRIMES].sum()
+    total = sample if idx == 0 else total.add(sample, fill_value=0)
+
+  df = total.astype(np.int32).reset_index()  # counts -> halves the memory traffic
   df = _add_age(df, end_year=end_year)
 
   return df
@@ -91,14 +93,22 @@ def _file_path(
 
 
 def _add_age(df, end_year):  # TODO: code duplication with assignment_preprocessing.py
-  age = pd.to_datetime(str(end_year)) - pd.to_datetime(df['def.dob'])
-  age = age.dt.days / 365.25
-
-  df = df[age > 10]  # likely data entry errors
-  df['age_cat'] = pd.cut(
-    age, right=True, bins=[0, 17, 29, 500], labels=['< 18', '18-29', '> 29']
-  ).astype('str')
-  df = df[df['age_cat'] != '< 18']  # remove all underage entries
+  # age at the start of `end_year` lies in (k - 1, k] for k = end_year - birth
+  # year -> thresholding k equals thresholding the fractional age (ISO dates)
+  birth_year = pd.to_numeric(df['def.dob'].str.slice(0, 4), errors='coerce')
+  unparsed = birth_year.isna() & df['def.dob'].notna()
+  if unparsed.any():  # would otherwise silently drop the rows below
+    raise ValueError(
+      f'Dates of birth not in ISO format, e.g., "{df.loc[unparsed, "def.dob"].iloc[0]}"')
+  age = end_year - birth_year.to_numpy()
+
+  # right-closed bins (0, 17], (17, 29], (29, inf)
+  labels = np.array(['< 18', '18-29', '> 29'], dtype=object)
+  idx = np.searchsorted([17, 29], age)
+
+  keep = age > 10  # likely data entry errors
+  keep &= idx > 0  # remove all underage entries
+  df = df[keep].assign(age_cat=labels[idx[keep]])
 
   return df
 
@@ -115,31 +125,61 @@ def _count_unobserved(pop, lam, arrest_col, lambda_col):
 
 
 def _sample_unobserved(df, groups, n_samples_div, rng):
-  def _sample(group):
-    if group['unobserved_crimes'].nunique() > 1:
-      raise ValueError(f'Conflicting no. of unobserved crimes to be generated '
-                       f'{group["unobserved_crimes"].unique()}')
-
-    n_samples = int(group['unobserved_crimes'].mean() / n_samples_div)
-    if group['crime_weight'].sum() <= 0 or n_samples < 1:
-      return None  # no crimes of this type (happens for some < 18 categories)
-
-    samples = group['def.uid'].sample(
-      n=n_samples,
-      replace=True,
-      weights=group['crime_weight'],
-      random_state=rng
-    )
-    return list(Counter(samples).items())
-
-  # df is melted over crimes -> subset only individual records for `crime`
-  samples = df.groupby(groups).apply(_sample).to_frame('def.uid').reset_index()
-  samples = samples[samples['def.uid'].notna()]  # remove categories w/o samples
-  samples = samples.explode('def.uid')
-  samples['offense_unobserved'] = samples['def.uid'].str[1]
-  samples['def.uid'] = samples['def.uid'].str[0]
-
-  return samples
+  grouped = df.groupby(groups)
+  n_unobserved = grouped['unobserved_crimes']
+  if (n_unobserved.nunique() > 1).any():
+    conflicting = n_unobserved.unique()[n_unobserved.nunique() > 1]
+    raise ValueError(f'Conflicting no. of unobserved crimes to be generated '
+                     f'{conflicting.iloc[0]}')
+  n_samples = (n_unobserved.mean() / n_samples_div).astype(int).to_numpy()
+  # no crimes of this type (happens for some < 18 categories)
+  has_samples = (grouped['crime_weight'].sum().to_numpy() > 0) & (n_samples >= 1)
+
+  # rows ordered by group -> each group is a contiguous slice
+  codes = grouped.ngroup().to_numpy()
+  order = np.argsort(codes, kind='stable')
+  bounds = np.searchsorted(codes[order], np.arange(grouped.ngroups + 1))
+  weights = df['crime_weight'].fillna(0).to_numpy(np.float64)[order]
+  sampled = np.repeat(has_samples, np.diff(bounds))
+  if (weights[bounds[0]:bounds[-1]][sampled] < 0).any():
+    raise ValueError('Negative weights in groups with unobserved crimes to sample')
+
+  # one multinomial draw per group gives the no. of samples of each record
+  seeds = rng.randint(np.iinfo(np.int32).max, size=grouped.ngroups)
+  sorted_counts = np.zeros(len(df), dtype=np.int32)
+  _draw_multinomial(
+    weights, bounds, np.where(has_samples, n_samples, 0), seeds, sorted_counts)
+
+  counts = np.empty_like(sorted_counts)
+  counts[order] = sorted_counts
+  return counts  # aligned with the rows of df
+
+
+@njit(parallel=True, cache=True)
+def _draw_multinomial(weights, bounds, n_samples, seeds, counts):
+  for group in prange(len(n_samples)):
+    remaining = n_samples[group]
+    if remaining < 1:
+      continue
+    start, end = bounds[group], bounds[group + 1]
+    np.random.seed(seeds[group])  # per group -> independent of thread layout
+
+    # conditional binomials as in np.random.multinomial, but zero weights are
+    # skipped and the ratio is clipped (numba's version can exceed 1 there)
+    left = weights[start:end].sum()
+    last = end - 1
+    while weights[last] <= 0:
+      last -= 1
+    for row in range(start, last):
+      if remaining == 0:
+        break
+      if weights[row] <= 0:
+        continue
+      drawn = np.random.binomial(remaining, min(weights[row] / left, 1.0))
+      counts[row] = drawn
+      remaining -= drawn
+      left -= weights[row]
+    counts[last] = remaining
 
 
 def _add_unobserved(
@@ -176,10 +216,8 @@ def _add_unobserved(
   df['crime_weight'] = df['unobserved_per_person'] + omega * df['offense_count']
 
   # sample unobserved
-  samples = _sample_unobserved(
+  df['offense_unobserved'] = _sample_unobserved(
     df=df, groups=group_all, n_samples_div=n_samples_div, rng=rng)
-  df = pd.merge(df, samples, how='left', on=group_all + ['def.uid'])
-  df['offense_unobserved'] = df['offense_unobserved'].fillna(0).astype('int')
   df['offense_total'] = df['offense_count'] + df['offense_unobserved']
 
   return df
@@ -213,6 +251,7 @@ def _window_sampler(
       id_vars=df.columns.difference(CRIMES), value_vars=CRIMES,
       var_name='offense_category', value_name='offense_count'
     )
+    df['offense_count'] = df['offense_count'].astype('int32')
 
     # sample new unobserved crimes
     len_before = len(df)
@@ -233,10 +272,10 @@ def _window_sampler(
       raise RuntimeError('Bug: sampling of unobserved changed the size of the data')
 
     # convert back into the wide format
-    df = pd.pivot_table(
-      df, columns='offense_category', values='offense_total', sort=False,
-      index=['def.gender', 'calc.race', 'def.uid', 'def.dob', 'age_cat']
-    ).reset_index()
+    index = ['def.gender', 'calc.race', 'def.uid', 'def.dob', 'age_cat']
+    df = df.groupby(index + ['offense_category'], sort=False)['offense_total'].sum()
+    df = df.unstack('offense_category', fill_value=0).reset_index()
+    df = df.reindex(columns=index + CRIMES, fill_value=0)
 
     return df
 
@@ -3,7 +3,6 @@ import pandas as pd
 
 from typing import List
 from cj_pipeline.config import logger
-from sklearn.linear_model import LinearRegression
 
 
 def subset_pd_bool(df, **kwargs):
@@ -28,33 +27,46 @@ def smooth_arrest_rates(
     mode: str,
 ) -> pd.DataFrame:
   smooth_groups = [g for g in groups if g != x_col]
-
-  def _smooth(group):
-    data = group[group[arrest_col].notna()]
-    data, smoother = init_smoothing(
-      data=data,
-      mode=mode,
-      arrest_col=arrest_col,
-      count_col=count_col
-    )
-    if len(data) == 0:
-      logger.warn(f'no arrest data to smooth for "{arrest_col}" in group: '
-                  f'{group[smooth_groups].drop_duplicates().iloc[0].to_dict()}')
-      return list(zip(x_test.squeeze(1), [None] * len(x_test)))
-
-    x_train = data[x_col].to_numpy()[:, None]
-    y_train, weights = data[arrest_col], data[count_col]
-    smoothed = smoother(x_train, y_train, weights=weights, x_test=x_test)
-    if pd.isna(smoothed).sum() > 0:
-      raise RuntimeError('NaN values in smoothed regression')
-    return list(zip(x_test.squeeze(1), smoothed))
-
-  smoothed = df.groupby(smooth_groups).apply(
-    _smooth).to_frame(smooth_col).reset_index()
-  smoothed = smoothed.explode(smooth_col)
-  smoothed[x_col] = smoothed[smooth_col].str[0].astype(df[x_col].dtype)
-  smoothed[smooth_col] = smoothed[smooth_col].str[1]
-  return smoothed
+  x0 = x_test.min()  # shift years for better conditioning of the sums
+
+  data = df[df[arrest_col].notna()]
+  data, smoother = init_smoothing(
+    data=data,
+    mode=mode,
+    arrest_col=arrest_col,
+    count_col=count_col
+  )
+  sums = _weighted_sums(
+    data, groups=smooth_groups, x=data[x_col] - x0,
+    y=data[arrest_col], weights=data[count_col])
+
+  # predict for all x_test in every group, including those without data
+  smoothed = df[smooth_groups].dropna().drop_duplicates()
+  smoothed = pd.merge(
+    smoothed,
+    pd.DataFrame({x_col: x_test.squeeze(1).astype(df[x_col].dtype)}),
+    how='cross',
+  )
+  smoothed = pd.merge(smoothed, sums, how='left', on=smooth_groups)
+  no_data = smoothed['w'].isna()
+  for group in smoothed.loc[no_data, smooth_groups].drop_duplicates().to_dict('records'):
+    logger.warning(f'no arrest data to smooth for "{arrest_col}" in group: {group}')
+
+  smoothed[smooth_col] = smoother(smoothed, x=smoothed[x_col] - x0)
+  if smoothed.loc[~no_data, smooth_col].isna().sum() > 0:
+    raise RuntimeError('NaN values in smoothed regression')
+  return smoothed[smooth_groups + [x_col, smooth_col]]
+
+
+def _weighted_sums(data, groups, x, y, weights):
+  sums = pd.DataFrame({
+    'w': weights, 'wx': weights * x, 'wy': weights * y,
+    'wxx': weights * x**2, 'wxy': weights * x * y,
+  })
+  grouped = sums.groupby([data[g] for g in groups])
+  sums = grouped.sum()
+  sums['n_x'] = x.groupby([data[g] for g in groups]).nunique()
+  return sums.reset_index()
 
 
 def init_smoothing(data, mode, arrest_col, count_col):
@@ -77,15 +89,16 @@ def init_smoothing(data, mode, arrest_col, count_col):
   return data, smoother
 
 
-def avg_smoother(x_train, y_train, weights, x_test, **_):
-  weights /= np.nansum(weights)
-  smoothed = [np.nansum(y_train * weights)] * len(x_test)
+def avg_smoother(sums, **_):
+  smoothed = sums['wy'] / sums['w']
   return smoothed
 
 
-def linear_smoother(x_train, y_train, weights, x_test, eps=0.0):
-  model = LinearRegression()
-  model.fit(x_train, y_train, weights)
-  smoothed = model.predict(x_test).clip(min=eps)
+def linear_smoother(sums, x, eps=0.0):
+  # closed form weighted least squares, evaluated per group at `x`
+  x_mean, y_mean = sums['wx'] / sums['w'], sums['wy'] / sums['w']
+  s_xx = sums['wxx'] - sums['w'] * x_mean**2
+  s_xy = sums['wxy'] - sums['w'] * x_mean * y_mean
+  slope = (s_xy / s_xx).where(sums['n_x'] > 1, 0.0)  # single year -> constant
+  smoothed = (y_mean + slope * (x - x_mean)).clip(lower=eps)
   return smoothed
-
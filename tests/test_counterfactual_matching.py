@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dame_flame.utils import post_processing
+
+from cj_pipeline.counterfactual_matching import _group_effects, _matching_model
+
+
+def _score_data(rng, n=300):
+    df = pd.DataFrame(
+        rng.randint(0, 3, size=(n, 4)), columns=['c0', 'c1', 'c2', 'c3'])
+    df['treated'] = rng.randint(0, 2, size=n)
+    df['outcome'] = rng.randint(0, 4, size=n) + df['treated']
+    return df
+
+
+@pytest.mark.parametrize('repeat_match', [False, True])
+@pytest.mark.parametrize('matching_alg', ['dame', 'flame', 'hybrid'])
+def test_group_effects(matching_alg, repeat_match):
+    df = _score_data(np.random.RandomState(0))
+
+    model, ate, _ = _matching_model(
+        df, matching_alg=matching_alg, repeat_match=repeat_match)
+    assert ate == pytest.approx(post_processing.ATE(model), rel=1e-12)
+
+    cates, _, unit_groups = _group_effects(model)
+    expected = post_processing.CATE(model, unit_groups.index)
+    np.testing.assert_allclose(
+        unit_groups.map(cates).to_numpy(dtype=float),
+        np.asarray(expected, dtype=float), rtol=1e-12)
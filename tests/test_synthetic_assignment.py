@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from cj_pipeline.synthetic_assignment import _sample_unobserved
+
+
+def _groups(n_groups, n_rows, rng, zero_share=0.0):
+    df = pd.DataFrame({
+        'group': np.repeat(np.arange(n_groups), n_rows),
+        'def.uid': np.arange(n_groups * n_rows),
+        'crime_weight': rng.exponential(size=n_groups * n_rows),
+    })
+    df.loc[rng.random(len(df)) < zero_share, 'crime_weight'] = 0.0
+    df['unobserved_crimes'] = df['group'].map(
+        dict(enumerate(rng.randint(1, 1000, size=n_groups))))
+    return df
+
+
+def test_sample_zero_weights():
+    rng = np.random.RandomState(0)
+    df = _groups(n_groups=2000, n_rows=10, rng=rng, zero_share=0.3)
+    df.loc[df['group'] == 0, 'crime_weight'] = [0, 0, 0, 1, 2, 0, 0, 0, 0, 0]
+
+    counts = _sample_unobserved(df, groups=['group'], n_samples_div=1, rng=rng)
+
+    zero = (df['crime_weight'] == 0).to_numpy()
+    assert (counts[zero] == 0).all()
+    has_weight = df.groupby('group')['crime_weight'].sum() > 0
+    totals = pd.Series(counts).groupby(df['group']).sum()
+    expected = df.groupby('group')['unobserved_crimes'].first()
+    assert (totals[has_weight] == expected[has_weight]).all()
+    assert (totals[~has_weight] == 0).all()
+
+
+def test_sample_group_totals():
+    df = _groups(n_groups=200, n_rows=25, rng=np.random.RandomState(0))
+    df['sex'] = np.where(df['def.uid'] % 2 == 0, 'Male', 'Female')
+    df.loc[df['group'] == 0, 'crime_weight'] = 0.0  # no crimes of this type
+    df.loc[df['group'] == 1, 'unobserved_crimes'] = 2  # < 1 sample per window
+
+    counts = _sample_unobserved(
+        df, groups=['group', 'sex'], n_samples_div=3, rng=np.random.RandomState(1))
+    again = _sample_unobserved(
+        df, groups=['group', 'sex'], n_samples_div=3, rng=np.random.RandomState(1))
+    np.testing.assert_array_equal(counts, again)
+
+    grouped = df.groupby(['group', 'sex'])
+    totals = pd.Series(counts).groupby([df['group'], df['sex']]).sum()
+    expected = (grouped['unobserved_crimes'].first() / 3).astype(int)
+    expected[grouped['crime_weight'].sum() <= 0] = 0
+    pd.testing.assert_series_equal(
+        totals, expected, check_names=False, check_dtype=False)
+
+
+def test_sample_proportions():
+    weights = np.array([0.0, 1.0, 2.0, 0.0, 5.0, 2.0, 0.0])
+    df = pd.DataFrame({
+        'group': 0,
+        'def.uid': np.arange(len(weights)),
+        'crime_weight': weights,
+        'unobserved_crimes': 200_000,
+    })
+
+    counts = _sample_unobserved(
+        df, groups=['group'], n_samples_div=1, rng=np.random.RandomState(0))
+
+    np.testing.assert_allclose(
+        counts / counts.sum(), weights / weights.sum(), atol=5e-3)
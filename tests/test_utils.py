@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from cj_pipeline.utils import init_smoothing, smooth_arrest_rates
+
+MODES = ['lr_pc', 'lr_pr', 'lr_all', 'avg_pc', 'avg_pr', 'avg_all']
+
+
+def _arrest_data(rng):
+    years = np.arange(2000, 2012)
+    df = pd.MultiIndex.from_product(
+        [['Male', 'Female'], ['Black', 'White', 'Hispanic'], years],
+        names=['sex', 'race', 'year']).to_frame(index=False)
+    df['count'] = rng.randint(0, 50, size=len(df)).astype(float)
+    df['ar'] = rng.uniform(size=len(df))
+    df.loc[rng.uniform(size=len(df)) < 0.2, 'ar'] = 0.0
+    df.loc[rng.uniform(size=len(df)) < 0.1, 'ar'] = np.nan
+
+    # a group with a single year and a group without any arrest data
+    single = (df['sex'] == 'Female') & (df['race'] == 'Hispanic')
+    df.loc[single & (df['year'] != 2005), 'ar'] = np.nan
+    df.loc[single & (df['year'] == 2005), ['ar', 'count']] = [0.3, 10.0]
+    df.loc[(df['sex'] == 'Male') & (df['race'] == 'Hispanic'), 'ar'] = np.nan
+    return df, years[:, None]
+
+
+def _reference(df, x_test, mode):
+    smoothed = {}
+    for group, group_df in df.groupby(['sex', 'race']):
+        data, _ = init_smoothing(
+            data=group_df[group_df['ar'].notna()], mode=mode,
+            arrest_col='ar', count_col='count')
+        if len(data) == 0:
+            continue
+        y, weights = data['ar'].to_numpy(), data['count'].to_numpy()
+        if mode.startswith('lr_'):
+            model = LinearRegression()
+            model.fit(data[['year']].to_numpy(), y, weights)
+            pred = model.predict(x_test).clip(min=0.0)
+        else:
+            pred = np.full(len(x_test), np.sum(y * weights / weights.sum()))
+        smoothed.update({(*group, x): p for x, p in zip(x_test.squeeze(1), pred)})
+    return smoothed
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_smooth_arrest_rates(mode):
+    df, x_test = _arrest_data(np.random.RandomState(0))
+
+    smoothed = smooth_arrest_rates(
+        df=df, groups=['sex', 'race', 'year'], x_test=x_test, x_col='year',
+        count_col='count', arrest_col='ar', smooth_col='sar', mode=mode)
+
+    smoothed = smoothed.set_index(['sex', 'race', 'year'])['sar']
+    expected = _reference(df, x_test, mode)
+    assert len(smoothed) == 6 * len(x_test)
+    assert smoothed.drop(list(expected)).isna().all()
+    np.testing.assert_allclose(
+        smoothed.loc[list(expected)].to_numpy(dtype=float),
+        np.array(list(expected.values())), rtol=1e-8, atol=1e-12)